@@ -2,7 +2,11 @@
 
 import os
 import asyncio
+import logging
+import uuid
+import aiofiles
 from pathlib import Path
+from typing import Tuple
 from datetime import datetime
 from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.responses import HTMLResponse, JSONResponse
@@ -10,13 +14,30 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from starlette.requests import Request
 
-from config import validate_config, MAX_FILE_SIZE_MB
-from utils.validators import validate_upload
+from config import (
+    validate_config,
+    MAX_FILE_SIZE_MB,
+    HEADLESS_MODE,
+    BROWSER_POOL_SIZE,
+    PADDLE_OCR_WARMUP
+)
+from utils.validators import validate_upload, size_limit_error
 from utils.logger import logger
-from utils.ocr_handler import extract_text_from_pdf_or_image, extract_passport_text_with_gemini
-from extractors.combined_extraction import extract_data
+from models.passport_data import PassportData
+from models.g28_data import G28Data
+from utils.ocr_handler import (
+    extract_text_from_pdf_or_image,
+    extract_passport_text_with_gemini,
+    warmup_ocr
+)
+from extractors.combined_extraction import extract_passport, extract_g28, cross_validate
 from utils.data_mapper import map_to_form_fields, get_checkbox_fields
-from automation.form_filler import populate_form
+from automation.form_filler import (
+    populate_form,
+    start_browser,
+    create_fill_limiter,
+    stop_browser
+)
 
 # Validate configuration on startup
 try:
@@ -28,6 +49,31 @@ except ValueError as e:
 
 # Initialize FastAPI app
 app = FastAPI(title="Document Automation System")
+app.state.playwright = None
+app.state.browser = None
+app.state.fill_limiter = None
+
+@app.on_event("startup")
+async def startup_browser():
+    """Launch the shared headless browser once per process."""
+    if HEADLESS_MODE:
+        app.state.playwright, app.state.browser = await start_browser()
+        app.state.fill_limiter = create_fill_limiter(BROWSER_POOL_SIZE)
+
+@app.on_event("startup")
+async def startup_ocr():
+    """Load PaddleOCR before the first request when PADDLE_OCR_WARMUP is set."""
+    if PADDLE_OCR_WARMUP:
+        await asyncio.to_thread(warmup_ocr)
+
+@app.on_event("shutdown")
+async def shutdown_browser():
+    """Close the shared browser and stop Playwright."""
+    if app.state.browser or app.state.playwright:
+        await stop_browser(app.state.playwright, app.state.browser)
+        app.state.playwright = None
+        app.state.browser = None
+        app.state.fill_limiter = None
 
 # Ensure required directories exist
 Path("static").mkdir(exist_ok=True)
@@ -40,6 +86,29 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 templates = Jinja2Templates(directory="templates")
 
+# Read uploads in 1 MiB chunks so a large file is never held in memory at once
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+async def save_upload(upload: UploadFile, destination: Path, max_size_mb: int) -> None:
+    """Stream an uploaded file to disk in fixed-size chunks.
+    
+    Args:
+        upload: Uploaded file
+        destination: Path to write the file to
+        max_size_mb: Maximum file size in MB
+        
+    Raises:
+        ValueError: If the file exceeds the size limit
+    """
+    max_bytes = max_size_mb * 1024 * 1024
+    total = 0
+    async with aiofiles.open(destination, "wb") as f:
+        while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+            total += len(chunk)
+            if total > max_bytes:
+                raise size_limit_error(upload.filename, max_size_mb)
+            await f.write(chunk)
+
 def error_response(message: str, details: str) -> JSONResponse:
     """Create error response.
     
@@ -88,6 +157,98 @@ def success_response(result: dict) -> JSONResponse:
         }
     )
 
+class DocumentError(Exception):
+    """Per-document processing failure carrying the user-facing error."""
+    
+    def __init__(self, message: str, details: str):
+        super().__init__(f"{message}: {details}")
+        self.message = message
+        self.details = details
+
+async def prepare_passport(passport_path: Path) -> PassportData:
+    """OCR and extract the saved passport.
+    
+    Args:
+        passport_path: Path of the saved passport file
+        
+    Returns:
+        Extracted passport data
+        
+    Raises:
+        DocumentError: If text or data extraction fails
+    """
+    passport_text = await asyncio.to_thread(extract_passport_text_with_gemini, passport_path)
+    if not passport_text:
+        raise DocumentError(
+            "Failed to extract text from passport",
+            "Please ensure the passport document is clear and readable"
+        )
+    
+    logger.info(f"Passport text extracted: {len(passport_text)} characters")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Passport text (first 500): %s", passport_text[:500])
+        if len(passport_text) > 500:
+            logger.debug("Passport text (last 500): %s", passport_text[-500:])
+    
+    try:
+        return await asyncio.to_thread(extract_passport, passport_text)
+    except ValueError as e:
+        raise DocumentError("Data extraction failed", str(e)) from e
+
+async def prepare_g28(g28_path: Path) -> G28Data:
+    """OCR and extract the saved G-28 form.
+    
+    Args:
+        g28_path: Path of the saved G-28 file
+        
+    Returns:
+        Extracted G-28 data
+        
+    Raises:
+        DocumentError: If text or data extraction fails
+    """
+    g28_text = await asyncio.to_thread(extract_text_from_pdf_or_image, g28_path)
+    if not g28_text:
+        raise DocumentError(
+            "Failed to extract text from G-28",
+            "Please ensure the G-28 form is clear and readable"
+        )
+    
+    logger.info(f"G-28 text extracted: {len(g28_text)} characters")
+    
+    try:
+        return await asyncio.to_thread(extract_g28, g28_text)
+    except ValueError as e:
+        raise DocumentError("Data extraction failed", str(e)) from e
+
+async def extract_documents(passport_path: Path, g28_path: Path) -> Tuple[PassportData, G28Data]:
+    """Run both document pipelines concurrently, stopping at the first failure.
+    
+    Args:
+        passport_path: Path of the saved passport file
+        g28_path: Path of the saved G-28 file
+        
+    Returns:
+        Tuple of (PassportData, G28Data)
+        
+    Raises:
+        DocumentError: If either document fails; the other pipeline is cancelled
+    """
+    passport_task = asyncio.create_task(prepare_passport(passport_path))
+    g28_task = asyncio.create_task(prepare_g28(g28_path))
+    tasks = (passport_task, g28_task)
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            if task.exception() is not None:
+                raise task.exception()
+        return passport_task.result(), g28_task.result()
+    finally:
+        # Cancel whichever pipeline is still running so its pending Gemini call is skipped
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
     """Serve main UI."""
@@ -111,73 +272,47 @@ async def process_documents(
     g28_path = None
     
     try:
-        # Step 1: Validate files
+        # Step 1: Validate both files before doing any work on either
         logger.info("Validating uploaded files...")
         validate_upload(passport_file, MAX_FILE_SIZE_MB)
         validate_upload(g28_file, MAX_FILE_SIZE_MB)
-        logger.info("Files validated successfully")
         
         # Step 2: Save files
+        # Unique suffix so concurrent requests never share an upload path
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        passport_path = UPLOADS_DIR / f"passport_{timestamp}_{passport_file.filename}"
-        g28_path = UPLOADS_DIR / f"g28_{timestamp}_{g28_file.filename}"
+        upload_id = uuid.uuid4().hex[:8]
+        passport_path = UPLOADS_DIR / f"passport_{timestamp}_{upload_id}_{passport_file.filename}"
+        g28_path = UPLOADS_DIR / f"g28_{timestamp}_{upload_id}_{g28_file.filename}"
         
-        with open(passport_path, "wb") as f:
-            content = await passport_file.read()
-            f.write(content)
+        await save_upload(passport_file, passport_path, MAX_FILE_SIZE_MB)
+        logger.info(f"Passport saved: {passport_path.name}")
+        await save_upload(g28_file, g28_path, MAX_FILE_SIZE_MB)
+        logger.info(f"G-28 saved: {g28_path.name}")
         
-        with open(g28_path, "wb") as f:
-            content = await g28_file.read()
-            f.write(content)
-        
-        logger.info(f"Files saved: {passport_path.name}, {g28_path.name}")
-        
-        # Step 3: Extract passport text
-        logger.info("Extracting text from passport (using Gemini OCR)...")
-        passport_text = extract_passport_text_with_gemini(passport_path)
-        
-        if not passport_text:
-            return error_response(
-                "Failed to extract text from passport",
-                "Please ensure the passport document is clear and readable"
-            )
-        
-        logger.info(f"Passport text extracted: {len(passport_text)} characters")
-        logger.debug(f"Passport text (first 500): {passport_text[:500]}")
-        if len(passport_text) > 500:
-            logger.debug(f"Passport text (last 500): {passport_text[-500:]}")
-        
-        # Step 4: Extract G-28 text
-        logger.info("Extracting text from G-28...")
-        g28_text = extract_text_from_pdf_or_image(g28_path)
-        
-        if not g28_text:
-            return error_response(
-                "Failed to extract text from G-28",
-                "Please ensure the G-28 form is clear and readable"
-            )
-        
-        
-        # Step 5: Extract structured data with LLM
-        logger.info("Extracting structured data with Gemini...")
+        # Steps 3-5: OCR and extract each document; the two pipelines are
+        # independent and run concurrently
+        logger.info("Processing passport (Gemini OCR) and G-28 in parallel...")
         try:
-            passport_data, g28_data = extract_data(passport_text, g28_text)
-            logger.info("Data extraction completed successfully")
-        except ValueError as e:
-            return error_response("Data extraction failed", str(e))
+            passport_data, g28_data = await extract_documents(passport_path, g28_path)
+        except DocumentError as e:
+            return error_response(e.message, e.details)
+        
+        for note in cross_validate(passport_data, g28_data):
+            logger.info(f"Validation note: {note}")
+        logger.info("Data extraction completed successfully")
         
         # Step 6: Map to form fields
         logger.info("Mapping data to form fields...")
         fields = map_to_form_fields(passport_data, g28_data)
         checkboxes = get_checkbox_fields(g28_data)
-        logger.debug(f"Mapped {len(fields)} fields and {len(checkboxes)} checkboxes")
-        logger.debug(f"Fields: {fields}")
-        logger.debug(f"Checkboxes: {checkboxes}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Mapped %d fields and %d checkboxes", len(fields), len(checkboxes))
+            logger.debug("Fields: %s", fields)
+            logger.debug("Checkboxes: %s", checkboxes)
         
         # Step 7: Populate form
         logger.info("Populating form with Playwright...")
-        # Use asyncio.to_thread for sync Playwright
-        result = await asyncio.to_thread(populate_form, fields, checkboxes)
+        result = await populate_form(app.state.browser, app.state.fill_limiter, fields, checkboxes)
         
         if result["success"]:
             logger.info(
@@ -206,10 +341,10 @@ async def process_documents(
         try:
             if passport_path and passport_path.exists():
                 passport_path.unlink()
-                logger.debug(f"Cleaned up: {passport_path.name}")
+                logger.debug("Cleaned up: %s", passport_path.name)
             if g28_path and g28_path.exists():
                 g28_path.unlink()
-                logger.debug(f"Cleaned up: {g28_path.name}")
+                logger.debug("Cleaned up: %s", g28_path.name)
         except Exception as e:
             logger.warning(f"Failed to cleanup files: {e}")
 
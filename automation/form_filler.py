@@ -1,81 +1,251 @@
 """Form automation using Playwright."""
 
-from typing import Dict, List, Any
-from playwright.sync_api import sync_playwright, Page
-from config import FORM_URL, HEADLESS_MODE
+import asyncio
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Tuple
+from playwright.async_api import async_playwright, Page, Browser, Locator, Playwright
+from config import FORM_URL, HEADLESS_MODE, OUTPUT_RETENTION_MINUTES
 from utils.logger import logger
 
 # Global store to keep visual browsers open to prevent garbage collection
 _visual_sessions: List[Any] = []
 
-def _fill_page(page: Page, fields: Dict[str, str], checkboxes: Dict[str, bool], generate_pdf: bool) -> dict:
-    """Core logic to fill the form on a given page."""
+# Element whose presence means the form is ready to be filled
+FORM_READY_SELECTOR = "#passport-surname"
+
+# Form fields whose DOM id is shared with another field: field_id -> (DOM id, match index)
+_DUPLICATE_IDS = {
+    "passport-given-names": ("passport-given-names", 0),
+    "passport-middle-name": ("passport-given-names", 1),
+}
+
+# Looks up every target element in one round-trip; returns {field_id: {present, tag}}
+_INSPECT_FIELDS_JS = """(targets) => Object.fromEntries(targets.map(([key, id, index]) => {
+    const el = document.querySelectorAll('#' + CSS.escape(id))[index];
+    return [key, el ? {present: true, tag: el.tagName.toLowerCase()} : {present: false}];
+}))"""
+
+# Sets values in the DOM directly and dispatches input/change events so page
+# scripts still observe the edits; returns {filled: [...], failed: [...]}
+_FILL_FORM_JS = """({fields, checkboxes, duplicates}) => {
+    const filled = [], failed = [];
+    const find = (key) => {
+        const [id, index] = duplicates[key] || [key, 0];
+        return document.querySelectorAll('#' + CSS.escape(id))[index];
+    };
+    for (const [key, value] of Object.entries(fields)) {
+        const el = find(key);
+        if (!el) { failed.push(key); continue; }
+        if (el.tagName === 'SELECT') {
+            const option = Array.from(el.options).find(o => o.value === value || o.label === value);
+            if (!option) { failed.push(key); continue; }
+            el.value = option.value;
+        } else {
+            el.value = value;
+        }
+        el.dispatchEvent(new Event('input', {bubbles: true}));
+        el.dispatchEvent(new Event('change', {bubbles: true}));
+        filled.push(key);
+    }
+    for (const [key, checked] of Object.entries(checkboxes)) {
+        const el = find(key);
+        if (!el) { failed.push(key); continue; }
+        if (el.checked !== checked) el.click();
+        filled.push(key);
+    }
+    return {filled, failed};
+}"""
+
+def _locate(page: Page, field_id: str) -> Locator:
+    """Build the locator for a form field, resolving duplicate DOM ids."""
+    if field_id in _DUPLICATE_IDS:
+        dom_id, index = _DUPLICATE_IDS[field_id]
+        return page.locator(f"#{dom_id}").nth(index)
+    return page.locator(f"#{field_id}")
+
+async def start_browser() -> Tuple[Playwright, Browser]:
+    """Start Playwright and launch a long-lived headless Chromium.
+    
+    Returns:
+        Tuple of (Playwright, Browser)
+    """
+    logger.info("Launching shared headless browser...")
+    p = await async_playwright().start()
+    browser = await p.chromium.launch(headless=True)
+    return p, browser
+
+def create_fill_limiter(size: int) -> asyncio.Semaphore:
+    """Create the limiter bounding concurrent form fills on the shared browser.
+    
+    Args:
+        size: Maximum concurrent fills
+        
+    Returns:
+        Semaphore with `size` slots
+    """
+    logger.info(f"Form fill concurrency limited to {size}")
+    return asyncio.Semaphore(size)
+
+async def stop_browser(p: Optional[Playwright], browser: Optional[Browser]) -> None:
+    """Close the shared browser and stop Playwright.
+    
+    Args:
+        p: Playwright instance returned by start_browser
+        browser: Browser returned by start_browser
+    """
+    try:
+        if browser:
+            await browser.close()
+        if p:
+            await p.stop()
+        logger.info("Shared browser closed")
+    except Exception as e:
+        logger.warning(f"Failed to close shared browser: {e}")
+
+def cleanup_outputs(max_age_minutes: int = OUTPUT_RETENTION_MINUTES) -> None:
+    """Delete generated screenshots and PDFs older than `max_age_minutes`.
+    
+    Args:
+        max_age_minutes: Age after which an output file is removed
+    """
+    cutoff = time.time() - max_age_minutes * 60
+    for pattern in ("form_populated_*.png", "form_filled_*.pdf"):
+        for path in Path("uploads").glob(pattern):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    logger.debug("Removed expired output: %s", path.name)
+            except OSError as e:
+                logger.warning(f"Failed to remove output {path.name}: {e}")
+
+async def _fill_in_page(
+    page: Page,
+    fields: Dict[str, str],
+    checkboxes: Dict[str, bool]
+) -> Tuple[List[str], List[str]]:
+    """Set every field and checkbox with a single in-page script.
+    
+    Returns:
+        Tuple of (filled field IDs, failed field IDs)
+    """
+    logger.info(f"Filling {len(fields)} text fields and {len(checkboxes)} checkboxes in page...")
+    outcome = await page.evaluate(
+        _FILL_FORM_JS,
+        {
+            "fields": {field_id: value for field_id, value in fields.items() if value},
+            "checkboxes": checkboxes,
+            "duplicates": _DUPLICATE_IDS
+        }
+    )
+    for field_id in outcome["failed"]:
+        logger.warning(f"Field '{field_id}' not found or value not selectable")
+    return outcome["filled"], outcome["failed"]
+
+async def _fill_per_field(
+    page: Page,
+    fields: Dict[str, str],
+    checkboxes: Dict[str, bool]
+) -> Tuple[List[str], List[str]]:
+    """Fill fields one Playwright action at a time (shows typing in visual mode).
+    
+    Returns:
+        Tuple of (filled field IDs, failed field IDs)
+    """
     filled_fields = []
     failed_fields = []
-    screenshot_path = None
-    pdf_path = None
-
-    # Navigate to form
-    logger.info(f"Navigating to form: {FORM_URL}")
-    page.goto(FORM_URL)
-    page.wait_for_load_state("networkidle")
     
-    # Fill text fields and select dropdowns
+    # Inspect all target elements up front instead of per-field count/evaluate calls
+    targets = [
+        [field_id, *_DUPLICATE_IDS.get(field_id, (field_id, 0))]
+        for field_id in [*fields, *checkboxes]
+    ]
+    meta = await page.evaluate(_INSPECT_FIELDS_JS, targets)
+    
+    # Build each locator once rather than inside the fill loop
+    locators = {field_id: _locate(page, field_id) for field_id in [*fields, *checkboxes]}
+    
+    # Fill text fields and select dropdowns one at a time: fill() types into
+    # the focused element, so concurrent fills on one page can cross fields
     logger.info(f"Filling {len(fields)} text fields...")
     for field_id, value in fields.items():
         if not value:
             continue
+        field_meta = meta[field_id]
+        if not field_meta["present"]:
+            logger.warning(f"Field '{field_id}' not found")
+            failed_fields.append(field_id)
+            continue
         try:
-            # Handle duplicate/virtual IDs
-            if field_id == "passport-given-names":
-                element = page.locator(f"#{field_id}").nth(0)
-            elif field_id == "passport-middle-name":
-                element = page.locator("#passport-given-names").nth(1)
-            else:
-                element = page.locator(f"#{field_id}")
-
-            if element.count() > 0:
-                tag_name = element.evaluate("el => el.tagName.toLowerCase()")
-                if tag_name == "select":
-                    element.select_option(value)
-                    logger.debug(f"Selected '{value}' in '{field_id}'")
-                else:
-                    element.fill(value)
-                    logger.debug(f"Filled '{field_id}': {value}")
-                filled_fields.append(field_id)
+            element = locators[field_id]
+            if field_meta["tag"] == "select":
+                await element.select_option(value)
+                logger.debug("Selected '%s' in '%s'", value, field_id)
             else:
-                failed_fields.append(field_id)
-                logger.warning(f"Field '{field_id}' not found")
+                await element.fill(value)
+                logger.debug("Filled '%s': %s", field_id, value)
+            filled_fields.append(field_id)
         except Exception as e:
-            failed_fields.append(field_id)
             logger.warning(f"Failed to fill '{field_id}': {e}")
+            failed_fields.append(field_id)
     
     # Handle checkboxes
     logger.info(f"Setting {len(checkboxes)} checkboxes...")
     for field_id, checked in checkboxes.items():
+        if not meta[field_id]["present"]:
+            failed_fields.append(field_id)
+            continue
         try:
-            element = page.locator(f"#{field_id}")
-            if element.count() > 0:
-                if checked:
-                    element.check()
-                else:
-                    element.uncheck()
-                filled_fields.append(field_id)
+            element = locators[field_id]
+            if checked:
+                await element.check()
             else:
-                failed_fields.append(field_id)
+                await element.uncheck()
+            filled_fields.append(field_id)
         except Exception as e:
-            failed_fields.append(field_id)
             logger.warning(f"Failed to set checkbox '{field_id}': {e}")
+            failed_fields.append(field_id)
     
-    # Take screenshot
-    screenshot_path = "uploads/form_populated.png"
-    page.screenshot(path=screenshot_path)
-    logger.info(f"Screenshot saved to {screenshot_path}")
+    return filled_fields, failed_fields
+
+async def _fill_page(
+    page: Page,
+    fields: Dict[str, str],
+    checkboxes: Dict[str, bool],
+    generate_pdf: bool,
+    bulk: bool
+) -> dict:
+    """Core logic to fill the form on a given page."""
+    screenshot_path = None
+    pdf_path = None
+
+    # Navigate to form
+    logger.info(f"Navigating to form: {FORM_URL}")
+    await page.goto(FORM_URL, wait_until="domcontentloaded")
+    # The form is fillable once its first field exists; no need to wait for network idle
+    await page.locator(FORM_READY_SELECTOR).wait_for(state="attached", timeout=5000)
+    
+    if bulk:
+        filled_fields, failed_fields = await _fill_in_page(page, fields, checkboxes)
+    else:
+        filled_fields, failed_fields = await _fill_per_field(page, fields, checkboxes)
+    
+    # Unique names so concurrent fills don't overwrite each other's output;
+    # expired outputs from earlier requests are removed first
+    cleanup_outputs()
+    output_id = uuid.uuid4().hex[:8]
     
-    # Save as PDF (Only if requested/supported)
+    # Take screenshot and save PDF (only if requested/supported) concurrently
+    screenshot_path = f"uploads/form_populated_{output_id}.png"
+    captures = [page.screenshot(path=screenshot_path, type="png", omit_background=True)]
     if generate_pdf:
-        pdf_path = "uploads/form_filled.pdf"
-        page.pdf(path=pdf_path)
+        pdf_path = f"uploads/form_filled_{output_id}.pdf"
+        captures.append(page.pdf(path=pdf_path, print_background=False))
+    await asyncio.gather(*captures)
+    
+    logger.info(f"Screenshot saved to {screenshot_path}")
+    if pdf_path:
         logger.info(f"PDF saved to {pdf_path}")
     
     return {
@@ -89,33 +259,42 @@ def _fill_page(page: Page, fields: Dict[str, str], checkboxes: Dict[str, bool],
         "error": None
     }
 
-def populate_form(fields: Dict[str, str], checkboxes: Dict[str, bool]) -> dict:
+async def populate_form(
+    browser: Optional[Browser],
+    limiter: Optional[asyncio.Semaphore],
+    fields: Dict[str, str],
+    checkboxes: Dict[str, bool]
+) -> dict:
     """Populate form using Playwright.
     
-    If HEADLESS_MODE is True: Runs headless, generates PDF, closes browser.
+    If HEADLESS_MODE is True: Waits for a free slot on the shared browser, fills
+    in a fresh context (no state shared between applicants), generates PDF and
+    closes the context.
     If HEADLESS_MODE is False: Runs visible (slow_mo), NO PDF, keeps browser open.
     """
     try:
-        logger.info(f"Launching browser (HEADLESS_MODE={HEADLESS_MODE})...")
-        
         if HEADLESS_MODE:
-            # HEADLESS: Use context manager, auto-close
-            with sync_playwright() as p:
-                browser = p.chromium.launch(headless=True)
-                page = browser.new_page()
-                result = _fill_page(page, fields, checkboxes, generate_pdf=True)
-                browser.close()
-                return result
+            if browser is None or limiter is None:
+                raise RuntimeError("Shared browser is not running")
+            # HEADLESS: Fresh context per request, browser stays up
+            async with limiter:
+                context = await browser.new_context()
+                try:
+                    page = await context.new_page()
+                    return await _fill_page(page, fields, checkboxes, generate_pdf=True, bulk=True)
+                finally:
+                    await context.close()
         else:
+            logger.info("Launching visual browser...")
             # VISUAL: Manual start, keep open
-            p = sync_playwright().start()
-            browser = p.chromium.launch(headless=False, slow_mo=50)
-            page = browser.new_page()
+            p = await async_playwright().start()
+            visual_browser = await p.chromium.launch(headless=False, slow_mo=50)
+            page = await visual_browser.new_page()
             
-            result = _fill_page(page, fields, checkboxes, generate_pdf=False)
+            result = await _fill_page(page, fields, checkboxes, generate_pdf=False, bulk=False)
             
             # Keep reference to prevent closure
-            _visual_sessions.append((p, browser))
+            _visual_sessions.append((p, visual_browser))
             logger.info("Visual Mode: Browser window left open.")
             
             return result
@@ -14,8 +14,15 @@ FORM_URL = os.getenv("FORM_URL", "")
 # Optional configuration with defaults
 GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "gemini-1.5-flash")
 HEADLESS_MODE = os.getenv("HEADLESS_MODE", "false").lower() == "true"
+PADDLE_OCR_WARMUP = os.getenv("PADDLE_OCR_WARMUP", "false").lower() in ("1", "true")
 MAX_FILE_SIZE_MB = int(os.getenv("MAX_FILE_SIZE_MB", "20"))
 LOG_FILE = os.getenv("LOG_FILE", "logs/app.log")
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", str(os.cpu_count() or 4)))
+OUTPUT_RETENTION_MINUTES = int(os.getenv("OUTPUT_RETENTION_MINUTES", "60"))
+# Extraction cache stores extracted PII on disk, so it is off unless enabled
+EXTRACTION_CACHE_ENABLED = os.getenv("EXTRACTION_CACHE_ENABLED", "false").lower() in ("1", "true")
+EXTRACTION_CACHE_DIR = os.getenv("EXTRACTION_CACHE_DIR", "cache/extraction")
+EXTRACTION_CACHE_TTL_HOURS = int(os.getenv("EXTRACTION_CACHE_TTL_HOURS", str(7 * 24)))
 
 def validate_config() -> bool:
     """Validate required configuration variables.
@@ -50,5 +57,17 @@ def validate_config() -> bool:
             f"Got: {MAX_FILE_SIZE_MB}"
         )
     
+    if BROWSER_POOL_SIZE <= 0:
+        raise ValueError(
+            f"BROWSER_POOL_SIZE must be a positive integer. "
+            f"Got: {BROWSER_POOL_SIZE}"
+        )
+    
+    if OUTPUT_RETENTION_MINUTES <= 0:
+        raise ValueError(
+            f"OUTPUT_RETENTION_MINUTES must be a positive integer. "
+            f"Got: {OUTPUT_RETENTION_MINUTES}"
+        )
+    
     return True
 
@@ -1,200 +1,378 @@
-"""Combined LLM extraction for passport and G-28 documents."""
+"""LLM extraction for passport and G-28 documents."""
 
-import json
-from typing import Tuple
-from datetime import datetime
+import os
+import orjson
+import time
+import hashlib
+import tempfile
+from pathlib import Path
+from typing import List, Optional
+from datetime import date
 import google.generativeai as genai
 
 from models.passport_data import PassportData
 from models.g28_data import G28Data, AttorneyInfo, EligibilityInfo, ClientInfo
-from config import GEMINI_API_KEY, GEMINI_MODEL_NAME
+from config import (
+    GEMINI_API_KEY,
+    GEMINI_MODEL_NAME,
+    EXTRACTION_CACHE_ENABLED,
+    EXTRACTION_CACHE_DIR,
+    EXTRACTION_CACHE_TTL_HOURS
+)
 from utils.logger import logger
 
+# Bump whenever a prompt changes so stale cached responses are ignored
+PROMPT_VERSION = "v3"
+
 # Configure Gemini API
 genai.configure(api_key=GEMINI_API_KEY)
+_MODEL = genai.GenerativeModel(GEMINI_MODEL_NAME)
+
+def _nullable(type_name: str) -> dict:
+    """Schema for a nullable scalar of the given Gemini type."""
+    return {"type": type_name, "nullable": True}
+
+def _object(*names: str, **typed: dict) -> dict:
+    """Schema for a nullable object of nullable string fields plus typed extras."""
+    properties = {name: _nullable("STRING") for name in names}
+    properties.update(typed)
+    return {"type": "OBJECT", "properties": properties, "nullable": True}
+
+# Response schemas mirroring the JSON structures described in the prompts
+PASSPORT_SCHEMA = _object(
+    "surname", "given_names", "middle_names", "passport_number",
+    "country_of_issue", "nationality", "date_of_birth", "place_of_birth",
+    "sex", "issue_date", "expiry_date"
+)
+
+G28_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "attorney": _object(
+            "first_name", "middle_name", "last_name", "street", "city",
+            "state", "zip", "country", "phone", "email", "fax", "online_account"
+        ),
+        "eligibility": _object(
+            "licensing_authority", "bar_number", "law_firm",
+            is_not_subject_to_orders=_nullable("BOOLEAN")
+        ),
+        "client": _object(
+            "first_name", "middle_name", "last_name", "street", "city",
+            "state", "zip", "country", "phone", "email", "a_number"
+        )
+    }
+}
+
+def _generation_config(schema: dict) -> dict:
+    """Strict JSON output; temperature 0 keeps responses deterministic for caching."""
+    return {
+        "response_mime_type": "application/json",
+        "response_schema": schema,
+        "temperature": 0
+    }
+
+_CACHE_DIR = Path(EXTRACTION_CACHE_DIR)
+_CACHE_TTL_SECONDS = EXTRACTION_CACHE_TTL_HOURS * 3600
 
-def extract_data(passport_text: str, g28_text: str) -> Tuple[PassportData, G28Data]:
-    """Extract both passport and G-28 data using combined LLM call.
+def _cache_key(kind: str, text: str) -> str:
+    """Build the cache key for one document's text.
     
-    This provides better accuracy through cross-validation and full context.
+    Args:
+        kind: Document kind ("passport" or "g28")
+        text: OCR text of the document
+    
+    Returns:
+        Hex SHA-256 digest of the prompt version, model, document kind and text
+    """
+    payload = PROMPT_VERSION + "\n" + GEMINI_MODEL_NAME + "\n" + kind + "\x00" + text
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _load_cached(key: str) -> Optional[dict]:
+    """Load a cached extraction result if present and not expired.
+    
+    Expired entries are deleted, since they hold extracted personal data.
     
     Args:
-        passport_text: OCR text from passport (may span multiple pages)
-        g28_text: OCR text from G-28 form
-        
+        key: Cache key
+    
     Returns:
-        Tuple of (PassportData, G28Data) objects
-        
+        Parsed extraction dict or None on miss
+    """
+    cache_path = _CACHE_DIR / f"{key}.json"
+    try:
+        if time.time() - cache_path.stat().st_mtime > _CACHE_TTL_SECONDS:
+            cache_path.unlink(missing_ok=True)
+            return None
+        return orjson.loads(cache_path.read_bytes())
+    except FileNotFoundError:
+        return None
+    except (OSError, orjson.JSONDecodeError) as e:
+        logger.warning(f"Ignoring unreadable extraction cache entry {key}: {e}")
+        return None
+
+def _sweep_expired_cache() -> None:
+    """Delete every cache entry older than the TTL, not just ones looked up again."""
+    cutoff = time.time() - _CACHE_TTL_SECONDS
+    for pattern in ("*.json", "*.tmp"):
+        for path in _CACHE_DIR.glob(pattern):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    logger.debug("Removed expired extraction cache entry: %s", path.name)
+            except OSError as e:
+                logger.warning(f"Failed to remove extraction cache entry {path.name}: {e}")
+
+def _store_cached(key: str, data: dict) -> None:
+    """Write an extraction result to the cache atomically, then sweep expired entries.
+    
+    Args:
+        key: Cache key
+        data: Parsed extraction dict
+    """
+    try:
+        _CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        cache_path = _CACHE_DIR / f"{key}.json"
+        # Unique temp file per write so concurrent threads never share one
+        with tempfile.NamedTemporaryFile(dir=_CACHE_DIR, suffix=".tmp", delete=False) as tmp:
+            tmp.write(orjson.dumps(data))
+        try:
+            os.replace(tmp.name, cache_path)
+        except OSError:
+            Path(tmp.name).unlink(missing_ok=True)
+            raise
+    except OSError as e:
+        logger.warning(f"Failed to write extraction cache entry {key}: {e}")
+    _sweep_expired_cache()
+
+def _llm_error(e: Exception) -> ValueError:
+    """Translate a Gemini client exception into a user-facing ValueError.
+    
+    Args:
+        e: Exception raised by the Gemini client
+    
+    Returns:
+        ValueError with a detailed error message
+    """
+    error_msg = str(e)
+    logger.error(f"LLM extraction failed: {error_msg}")
+    
+    # Provide detailed error information
+    if "API key" in error_msg or "authentication" in error_msg.lower():
+        return ValueError(
+            "Gemini API authentication failed. "
+            "Please verify your GEMINI_API_KEY in .env file."
+        )
+    elif "quota" in error_msg.lower() or "rate limit" in error_msg.lower():
+        return ValueError(
+            "Gemini API quota exceeded or rate limit reached. "
+            "Please try again later."
+        )
+    elif "model" in error_msg.lower():
+        return ValueError(
+            f"Invalid Gemini model name: {GEMINI_MODEL_NAME}. "
+            "Please check GEMINI_MODEL_NAME in .env file."
+        )
+    else:
+        return ValueError(
+            f"LLM extraction error: {error_msg}. "
+            "Please check your API key and model configuration."
+        )
+
+def _generate_json(kind: str, text: str, prompt: str, schema: dict) -> dict:
+    """Run a schema-constrained Gemini call, using the disk cache when enabled.
+    
+    Args:
+        kind: Document kind, part of the cache key
+        text: OCR text the prompt was built from
+        prompt: Full prompt
+        schema: Response schema
+    
+    Returns:
+        Parsed JSON response
+    
     Raises:
-        ValueError: If extraction fails with detailed error message
+        ValueError: If the call fails or returns invalid JSON
     """
+    cache_key = _cache_key(kind, text) if EXTRACTION_CACHE_ENABLED else None
+    data = _load_cached(cache_key) if cache_key else None
+    if data is not None:
+        logger.info(f"Using cached Gemini {kind} extraction ({cache_key[:12]})")
+        return data
+    
+    try:
+        logger.info(f"Sending {kind} request to Gemini API...")
+        response = _MODEL.generate_content(prompt, generation_config=_generation_config(schema))
+        
+        # JSON mode returns the bare JSON document
+        response_text = response.text
+    except Exception as e:
+        raise _llm_error(e) from e
+    
+    logger.debug("Gemini raw %s response:\n%s", kind, response_text)
+    
+    # Parse JSON
     try:
-        # Create comprehensive prompt for Gemini
-        prompt = f"""Extract structured data from passport and G-28 form text.
+        data = orjson.loads(response_text)
+    except orjson.JSONDecodeError as json_err:
+        logger.error(f"Failed to parse JSON from Gemini response: {json_err}")
+        logger.error(f"Response text (first 500 chars): {response_text[:500]}")
+        raise ValueError(
+            f"Gemini API returned invalid JSON format. "
+            f"JSON parsing error: {str(json_err)}"
+        )
+    
+    if cache_key:
+        _store_cached(cache_key, data)
+    return data
 
-IMPORTANT: Cross-validate data - the client name in G-28 should match 
-the passport holder name. If there are discrepancies, give the passport data and note them in validation_notes, 
+def extract_passport(passport_text: str) -> PassportData:
+    """Extract passport data with an LLM call.
+    
+    Args:
+        passport_text: OCR text from passport (may span multiple pages)
+    
+    Returns:
+        PassportData object
+    
+    Raises:
+        ValueError: If extraction fails with detailed error message
+    """
+    prompt = f"""Extract structured data from passport text.
 
 Passport Text:
 {passport_text}
 
+Return JSON with this exact structure:
+{{
+  "surname": "string or null",
+  "given_names": "string or null",
+  "middle_names": "string or null",
+  "passport_number": "string or null",
+  "country_of_issue": "string or null",
+  "nationality": "string or null",
+  "date_of_birth": "YYYY-MM-DD or null",
+  "place_of_birth": "string or null",
+  "sex": "M/F/X or null",
+  "issue_date": "YYYY-MM-DD or null",
+  "expiry_date": "YYYY-MM-DD or null"
+}}"""
+
+    passport_dict = _generate_json("passport", passport_text, prompt, PASSPORT_SCHEMA) or {}
+    
+    # Convert date strings to date objects
+    for date_field in ['date_of_birth', 'issue_date', 'expiry_date']:
+        if passport_dict.get(date_field) and isinstance(passport_dict[date_field], str):
+            try:
+                passport_dict[date_field] = date.fromisoformat(passport_dict[date_field])
+            except (ValueError, TypeError) as e:
+                logger.warning(f"Failed to parse {date_field}: {e}")
+                passport_dict[date_field] = None
+    
+    # Response schema already guarantees field types, so skip re-validation
+    passport_data = PassportData.model_construct(**passport_dict)
+    logger.info(f"Passport data extracted: {orjson.dumps(passport_data.model_dump()).decode()}")
+    return passport_data
+
+def extract_g28(g28_text: str) -> G28Data:
+    """Extract G-28 data with an LLM call.
+    
+    Args:
+        g28_text: OCR text from G-28 form
+    
+    Returns:
+        G28Data object
+    
+    Raises:
+        ValueError: If extraction fails with detailed error message
+    """
+    prompt = f"""Extract structured data from G-28 form text.
+
 G-28 Form Text:
 {g28_text}
 
-Return ONLY valid JSON with no additional text, comments, or markdown formatting.
-
-The JSON must have this exact structure:
+Return JSON with this exact structure:
 {{
-  "passport": {{
-    "surname": "string or null",
-    "given_names": "string or null",
-    "middle_names": "string or null",
-    "passport_number": "string or null",
-    "country_of_issue": "string or null",
-    "nationality": "string or null",
-    "date_of_birth": "YYYY-MM-DD or null",
-    "place_of_birth": "string or null",
-    "sex": "M/F/X or null",
-    "issue_date": "YYYY-MM-DD or null",
-    "expiry_date": "YYYY-MM-DD or null"
+  "attorney": {{
+    "first_name": "string or null",
+    "middle_name": "string or null",
+    "last_name": "string or null",
+    "street": "string or null",
+    "city": "string or null",
+    "state": "string or null (use state abbreviation if available)",
+    "zip": "string or null",
+    "country": "string or null",
+    "phone": "string or null",
+    "email": "string or null",
+    "fax": "string or null",
+    "online_account": "string or null"
   }},
-  "g28": {{
-    "attorney": {{
-      "first_name": "string or null",
-      "middle_name": "string or null",
-      "last_name": "string or null",
-      "street": "string or null",
-      "city": "string or null",
-      "state": "string or null (use state abbreviation if available)",
-      "zip": "string or null",
-      "country": "string or null",
-      "phone": "string or null",
-      "email": "string or null",
-      "fax": "string or null",
-      "online_account": "string or null"
-    }},
-    "eligibility": {{
-      "licensing_authority": "string or null",
-      "bar_number": "string or null",
-      "law_firm": "string or null",
-      "is_not_subject_to_orders": true or false or null
-    }},
-    "client": {{
-      "first_name": "string or null",
-      "middle_name": "string or null",
-      "last_name": "string or null",
-      "street": "string or null",
-      "city": "string or null",
-      "state": "string or null",
-      "zip": "string or null",
-      "country": "string or null",
-      "phone": "string or null",
-      "email": "string or null",
-      "a_number": "string or null"
-    }}
+  "eligibility": {{
+    "licensing_authority": "string or null",
+    "bar_number": "string or null",
+    "law_firm": "string or null",
+    "is_not_subject_to_orders": true or false or null
   }},
-  "validation_notes": "string or null - any discrepancies or validation issues"
+  "client": {{
+    "first_name": "string or null",
+    "middle_name": "string or null",
+    "last_name": "string or null",
+    "street": "string or null",
+    "city": "string or null",
+    "state": "string or null",
+    "zip": "string or null",
+    "country": "string or null",
+    "phone": "string or null",
+    "email": "string or null",
+    "a_number": "string or null"
+  }}
 }}"""
 
-        # Log the full prompt
-        # Log the full prompt
-        
-        # Initialize model
-        model = genai.GenerativeModel(GEMINI_MODEL_NAME)
-        
-        # Generate content
-        logger.info("Sending request to Gemini API...")
-        response = model.generate_content(prompt)
-        
-        # Extract JSON from response
-        response_text = response.text.strip()
-        logger.debug(f"Gemini raw response:\n{response_text}")
-        
-        # Remove markdown code blocks if present
-        if response_text.startswith("```json"):
-            response_text = response_text[7:]
-        if response_text.startswith("```"):
-            response_text = response_text[3:]
-        if response_text.endswith("```"):
-            response_text = response_text[:-3]
-        response_text = response_text.strip()
-        
-        # Parse JSON
-        try:
-            data = json.loads(response_text)
-        except json.JSONDecodeError as json_err:
-            logger.error(f"Failed to parse JSON from Gemini response: {json_err}")
-            logger.error(f"Response text (first 500 chars): {response_text[:500]}")
-            raise ValueError(
-                f"Gemini API returned invalid JSON format. "
-                f"JSON parsing error: {str(json_err)}"
-            )
-        
-        # Create PassportData object
-        passport_dict = data.get("passport", {})
-        
-        # Convert date strings to date objects
-        for date_field in ['date_of_birth', 'issue_date', 'expiry_date']:
-            if passport_dict.get(date_field) and isinstance(passport_dict[date_field], str):
-                try:
-                    passport_dict[date_field] = datetime.strptime(
-                        passport_dict[date_field],
-                        '%Y-%m-%d'
-                    ).date()
-                except (ValueError, TypeError) as e:
-                    logger.warning(f"Failed to parse {date_field}: {e}")
-                    passport_dict[date_field] = None
-        
-        passport_data = PassportData(**passport_dict)
-        logger.info(f"Passport data extracted: {passport_data.model_dump_json()}")
-        
-        # Create G28Data object
-        g28_dict = data.get("g28", {})
-        attorney = AttorneyInfo(**g28_dict.get("attorney", {})) if g28_dict.get("attorney") else None
-        eligibility = EligibilityInfo(**g28_dict.get("eligibility", {})) if g28_dict.get("eligibility") else None
-        client = ClientInfo(**g28_dict.get("client", {})) if g28_dict.get("client") else None
-        
-        g28_data = G28Data(
-            attorney=attorney,
-            eligibility=eligibility,
-            client=client
-        )
-        logger.info(f"G-28 data extracted: {g28_data.model_dump_json()}")
-        
-        # Log validation notes if present
-        validation_notes = data.get("validation_notes")
-        if validation_notes:
-            logger.info(f"LLM validation notes: {validation_notes}")
-        
-        logger.info("Successfully extracted both passport and G-28 data using LLM")
-        return passport_data, g28_data
-        
-    except ValueError:
-        # Re-raise ValueError (already has detailed error message)
-        raise
-    except Exception as e:
-        error_msg = str(e)
-        logger.error(f"LLM extraction failed: {error_msg}")
-        
-        # Provide detailed error information
-        if "API key" in error_msg or "authentication" in error_msg.lower():
-            raise ValueError(
-                "Gemini API authentication failed. "
-                "Please verify your GEMINI_API_KEY in .env file."
-            )
-        elif "quota" in error_msg.lower() or "rate limit" in error_msg.lower():
-            raise ValueError(
-                "Gemini API quota exceeded or rate limit reached. "
-                "Please try again later."
-            )
-        elif "model" in error_msg.lower():
-            raise ValueError(
-                f"Invalid Gemini model name: {GEMINI_MODEL_NAME}. "
-                "Please check GEMINI_MODEL_NAME in .env file."
-            )
-        else:
-            raise ValueError(
-                f"LLM extraction error: {error_msg}. "
-                "Please check your API key and model configuration."
-            )
+    g28_dict = _generate_json("g28", g28_text, prompt, G28_SCHEMA) or {}
+    
+    # Response schema already guarantees field types, so skip re-validation
+    attorney = AttorneyInfo.model_construct(**g28_dict.get("attorney", {})) if g28_dict.get("attorney") else None
+    eligibility = EligibilityInfo.model_construct(**g28_dict.get("eligibility", {})) if g28_dict.get("eligibility") else None
+    client = ClientInfo.model_construct(**g28_dict.get("client", {})) if g28_dict.get("client") else None
+    
+    g28_data = G28Data.model_construct(
+        attorney=attorney,
+        eligibility=eligibility,
+        client=client
+    )
+    logger.info(f"G-28 data extracted: {orjson.dumps(g28_data.model_dump()).decode()}")
+    return g28_data
+
+def _normalize_name(name: Optional[str]) -> str:
+    """Lowercase a name and collapse whitespace for comparison."""
+    return " ".join(name.lower().split()) if name else ""
 
+def cross_validate(passport_data: PassportData, g28_data: G28Data) -> List[str]:
+    """Check that the G-28 client name matches the passport holder.
+    
+    Passport data is treated as authoritative; discrepancies are only reported.
+    
+    Args:
+        passport_data: Extracted passport data
+        g28_data: Extracted G-28 data
+    
+    Returns:
+        List of validation notes (empty if consistent)
+    """
+    notes = []
+    client = g28_data.client
+    if not client:
+        return notes
+    
+    pairs = [
+        ("last name", client.last_name, passport_data.surname),
+        ("first name", client.first_name, passport_data.given_names),
+    ]
+    for label, g28_value, passport_value in pairs:
+        g28_norm = _normalize_name(g28_value)
+        passport_norm = _normalize_name(passport_value)
+        if g28_norm and passport_norm and g28_norm != passport_norm:
+            notes.append(
+                f"G-28 client {label} '{g28_value}' does not match "
+                f"passport '{passport_value}'"
+            )
+    return notes
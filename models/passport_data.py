@@ -18,10 +18,4 @@ class PassportData(BaseModel):
     sex: Optional[str] = Field(None, description="Sex (M/F/X)")
     issue_date: Optional[date] = Field(None, description="Date of issue")
     expiry_date: Optional[date] = Field(None, description="Date of expiration")
-    
-    class Config:
-        """Pydantic config."""
-        json_encoders = {
-            date: lambda v: v.isoformat() if v else None
-        }
 
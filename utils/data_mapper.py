@@ -4,6 +4,53 @@ from typing import Dict
 from models.passport_data import PassportData
 from models.g28_data import G28Data
 
+# Form field ID -> model attribute tables (all form IDs are hyphenated)
+
+# Passport fields (Part 3)
+PASSPORT_MAP = (
+    ("passport-surname", "surname"),
+    ("passport-given-names", "given_names"),
+    ("passport-middle-name", "middle_names"),  # Virtual ID for second field
+    ("passport-number", "passport_number"),
+    ("passport-country", "country_of_issue"),
+    ("passport-nationality", "nationality"),
+    ("passport-dob", "date_of_birth"),
+    ("passport-pob", "place_of_birth"),
+    ("passport-sex", "sex"),
+    ("passport-issue-date", "issue_date"),
+    ("passport-expiry-date", "expiry_date"),
+)
+
+# G-28 attorney fields (Part 1)
+ATTORNEY_MAP = (
+    ("online-account", "online_account"),
+    ("family-name", "last_name"),
+    ("given-name", "first_name"),
+    ("middle-name", "middle_name"),
+    ("street-number", "street"),
+    ("city", "city"),
+    ("state", "state"),
+    ("zip", "zip"),
+    ("country", "country"),
+    ("daytime-phone", "phone"),
+    ("email", "email"),
+)
+
+# G-28 eligibility fields (Part 2)
+ELIGIBILITY_MAP = (
+    ("licensing-authority", "licensing_authority"),
+    ("bar-number", "bar_number"),
+    ("law-firm", "law_firm"),
+)
+
+def _map_fields(source, mapping) -> Dict[str, str]:
+    """Read each mapped attribute, using ISO strings for dates and "" for None."""
+    fields = {}
+    for field_id, attr in mapping:
+        value = getattr(source, attr)
+        fields[field_id] = "" if value is None else str(value)
+    return fields
+
 def map_to_form_fields(passport_data: PassportData, g28_data: G28Data) -> Dict[str, str]:
     """Map extracted data to form field IDs.
     
@@ -14,52 +61,13 @@ def map_to_form_fields(passport_data: PassportData, g28_data: G28Data) -> Dict[s
     Returns:
         Dictionary mapping field IDs to values
     """
-    fields = {}
-    
-    # Helper function to format dates
-    def format_date(date_obj):
-        """Format date as MM/DD/YYYY."""
-        if date_obj:
-            return date_obj.strftime("%m/%d/%Y")
-        return ""
-    
-    # Helper function to get value or empty string
-    def get_value(val):
-        """Get value or empty string if None."""
-        return val if val is not None else ""
-    
-    # Map passport fields (Part 3 - uses hyphenated IDs)
-    fields["passport-surname"] = get_value(passport_data.surname)
-    fields["passport-given-names"] = get_value(passport_data.given_names)
-    fields["passport-middle-name"] = get_value(passport_data.middle_names)  # Virtual ID for second field
-    fields["passport-number"] = get_value(passport_data.passport_number)
-    fields["passport-country"] = get_value(passport_data.country_of_issue)
-    fields["passport-nationality"] = get_value(passport_data.nationality)
-    fields["passport-dob"] = str(passport_data.date_of_birth) if passport_data.date_of_birth else ""
-    fields["passport-pob"] = get_value(passport_data.place_of_birth)
-    fields["passport-sex"] = get_value(passport_data.sex)
-    fields["passport-issue-date"] = str(passport_data.issue_date) if passport_data.issue_date else ""
-    fields["passport-expiry-date"] = str(passport_data.expiry_date) if passport_data.expiry_date else ""
+    fields = _map_fields(passport_data, PASSPORT_MAP)
     
-    # Map G-28 attorney fields (Part 1 - uses hyphenated IDs)
     if g28_data.attorney:
-        fields["online-account"] = get_value(g28_data.attorney.online_account)
-        fields["family-name"] = get_value(g28_data.attorney.last_name)
-        fields["given-name"] = get_value(g28_data.attorney.first_name)
-        fields["middle-name"] = get_value(g28_data.attorney.middle_name)
-        fields["street-number"] = get_value(g28_data.attorney.street)
-        fields["city"] = get_value(g28_data.attorney.city)
-        fields["state"] = get_value(g28_data.attorney.state)
-        fields["zip"] = get_value(g28_data.attorney.zip)
-        fields["country"] = get_value(g28_data.attorney.country)
-        fields["daytime-phone"] = get_value(g28_data.attorney.phone)
-        fields["email"] = get_value(g28_data.attorney.email)
+        fields.update(_map_fields(g28_data.attorney, ATTORNEY_MAP))
     
-    # Map G-28 eligibility fields (Part 2 - uses hyphenated IDs)
     if g28_data.eligibility:
-        fields["licensing-authority"] = get_value(g28_data.eligibility.licensing_authority)
-        fields["bar-number"] = get_value(g28_data.eligibility.bar_number)
-        fields["law-firm"] = get_value(g28_data.eligibility.law_firm)
+        fields.update(_map_fields(g28_data.eligibility, ELIGIBILITY_MAP))
     
     # Note: Form A-28 doesn't have client fields in Part 4
     # Client info from G-28 is not mapped to this form
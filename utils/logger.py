@@ -1,12 +1,36 @@
 """Logging configuration for the document automation system."""
 
+import atexit
 import logging
 import sys
+import threading
+import time
 from pathlib import Path
-from logging.handlers import RotatingFileHandler
+from logging.handlers import MemoryHandler, RotatingFileHandler
 from config import LOG_FILE
 
 
+# Replacements for common problematic Unicode characters
+_SANITIZE_TABLE = str.maketrans({
+    '\u25ba': '>',  # Black right-pointing pointer
+    '\u25bc': 'v',  # Black down-pointing triangle
+    '\u2022': '*',  # Bullet
+    '\u2192': '->',  # Rightwards arrow
+    '\u2190': '<-',  # Leftwards arrow
+})
+
+_CONSOLE_ENCODING = sys.stdout.encoding or 'utf-8'
+_CONSOLE_SUPPORTS_UTF8 = (
+    (sys.stdout.encoding or '').lower().replace('-', '').replace('_', '')
+    in {'utf8', 'utf16', 'utf32'}
+)
+
+# File log buffering: records are written in batches of this many, on ERROR,
+# or at least every LOG_FLUSH_INTERVAL seconds
+LOG_BUFFER_CAPACITY = 512
+LOG_FLUSH_INTERVAL = 1.0
+
+
 def sanitize_for_console(text: str) -> str:
     """Sanitize text for console output to avoid encoding errors.
     
@@ -16,23 +40,15 @@ def sanitize_for_console(text: str) -> str:
     Returns:
         Sanitized text safe for console output
     """
-    # Replace common problematic Unicode characters
-    replacements = {
-        '\u25ba': '>',  # Black right-pointing pointer
-        '\u25bc': 'v',  # Black down-pointing triangle
-        '\u2022': '*',  # Bullet
-        '\u2192': '->',  # Rightwards arrow
-        '\u2190': '<-',  # Leftwards arrow
-    }
-    
-    result = text
-    for old, new in replacements.items():
-        result = result.replace(old, new)
+    result = text.translate(_SANITIZE_TABLE)
+    
+    # Pure ASCII is safe for any console encoding
+    if result.isascii():
+        return result
     
     # Encode to the console encoding, replacing any remaining problematic chars
     try:
-        encoding = sys.stdout.encoding or 'utf-8'
-        result = result.encode(encoding, errors='replace').decode(encoding)
+        result = result.encode(_CONSOLE_ENCODING, errors='replace').decode(_CONSOLE_ENCODING)
     except Exception:
         # Fallback: remove all non-ASCII
         result = result.encode('ascii', errors='replace').decode('ascii')
@@ -44,11 +60,27 @@ class ConsoleFormatter(logging.Formatter):
     """Custom formatter that sanitizes Unicode for console output."""
     
     def format(self, record):
-        # Sanitize the message for console output
-        if isinstance(record.msg, str):
-            record.msg = sanitize_for_console(record.msg)
+        # Sanitize the formatted line (message and args) only when the console
+        # can't print it as-is; the record itself is left untouched
         result = super().format(record)
-        return result
+        if _CONSOLE_SUPPORTS_UTF8 or result.isascii():
+            return result
+        return sanitize_for_console(result)
+
+
+def _start_periodic_flush(handler: MemoryHandler, interval: float) -> None:
+    """Flush a buffering handler on a daemon thread every `interval` seconds.
+    
+    Args:
+        handler: Handler to flush
+        interval: Seconds between flushes
+    """
+    def _run():
+        while True:
+            time.sleep(interval)
+            handler.flush()
+    
+    threading.Thread(target=_run, name="log-flush", daemon=True).start()
 
 
 def setup_logger(name: str = "alma_project") -> logging.Logger:
@@ -99,7 +131,20 @@ def setup_logger(name: str = "alma_project") -> logging.Logger:
     )
     file_handler.setLevel(logging.DEBUG)
     file_handler.setFormatter(file_formatter)
-    logger.addHandler(file_handler)
+    
+    # Buffer file records in memory to batch writes; ERROR+ flushes immediately
+    mem_handler = MemoryHandler(
+        LOG_BUFFER_CAPACITY,
+        flushLevel=logging.ERROR,
+        target=file_handler,
+        flushOnClose=True
+    )
+    mem_handler.setLevel(logging.DEBUG)
+    logger.addHandler(mem_handler)
+    
+    atexit.register(mem_handler.flush)
+    atexit.register(mem_handler.close)
+    _start_periodic_flush(mem_handler, LOG_FLUSH_INTERVAL)
     
     return logger
 
@@ -1,22 +1,39 @@
 """OCR handling utilities using PaddleOCR and Gemini."""
 
+import io
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional
-from PIL import Image, ImageEnhance
-import numpy as np
-from paddleocr import PaddleOCR
-import google.generativeai as genai
+from typing import TYPE_CHECKING, Optional, Union
+from PIL import Image
+import fitz  # PyMuPDF
 from utils.logger import logger
-from config import GEMINI_API_KEY, GEMINI_MODEL_NAME
+from config import GEMINI_API_KEY, GEMINI_MODEL_NAME, PADDLE_OCR_WARMUP
 from utils.pdf_handler import (
     extract_text_from_pdf,
     convert_pdf_page_to_image,
     get_pdf_page_count
 )
 
+if TYPE_CHECKING:
+    import numpy as np
+
 # Global PaddleOCR instance (lazy initialization)
 _ocr_reader = None
 
+# The PaddleOCR predictor is not thread-safe: initialization and inference
+# are serialized, while preprocessing runs concurrently on the pool below
+_ocr_lock = threading.RLock()
+
+# Minimum recognition score for an OCR text box to be kept
+OCR_MIN_CONFIDENCE = 0.3
+
+# Shared pool for per-page OCR; pages in flight are capped to bound memory
+_OCR_WORKERS = 2
+_OCR_MAX_PENDING = 4
+_ocr_executor = ThreadPoolExecutor(max_workers=_OCR_WORKERS, thread_name_prefix="ocr")
+
 def _get_ocr_reader():
     """Get or initialize PaddleOCR reader (cached).
     
@@ -24,92 +41,162 @@ def _get_ocr_reader():
         PaddleOCR instance
     """
     global _ocr_reader
-    if _ocr_reader is None:
-        logger.info("Initializing PaddleOCR (this may take a moment on first run)...")
-        _ocr_reader = PaddleOCR(
-            use_angle_cls=True,  # Enable text line orientation classification
-            use_doc_orientation_classify=True,  # Document-level orientation detection
-            use_doc_unwarping=True,  # Document unwarping for curved documents
-            lang='en'
-        )
-        logger.info("PaddleOCR initialized successfully")
+    with _ocr_lock:
+        if _ocr_reader is None:
+            # Imported lazily: loading Paddle is slow and memory-heavy
+            from paddleocr import PaddleOCR
+            
+            logger.info("Initializing PaddleOCR (this may take a moment on first run)...")
+            _ocr_reader = PaddleOCR(
+                use_angle_cls=True,  # Enable text line orientation classification
+                use_doc_orientation_classify=True,  # Document-level orientation detection
+                use_doc_unwarping=True,  # Document unwarping for curved documents
+                lang='en'
+            )
+            logger.info("PaddleOCR initialized successfully")
+            if PADDLE_OCR_WARMUP:
+                _run_dummy_inference(_ocr_reader)
     return _ocr_reader
 
-def preprocess_image(image: Image.Image) -> Image.Image:
-    """Preprocess image to improve OCR accuracy.
+def _run_ocr(ocr, img_array: "np.ndarray") -> list:
+    """Run OCR on an image array, serialized on the shared predictor.
     
     Args:
-        image: PIL Image
+        ocr: PaddleOCR instance
+        img_array: HxWx3 uint8 array
         
     Returns:
-        Preprocessed PIL Image
+        Raw PaddleOCR results
     """
-    # Convert to RGB if needed
-    if image.mode != 'RGB':
-        image = image.convert('RGB')
+    with _ocr_lock:
+        if hasattr(ocr, "predict"):
+            return ocr.predict(img_array)
+        return ocr.ocr(img_array)
+
+def _run_dummy_inference(ocr) -> None:
+    """Run one tiny inference so model kernels are built before real traffic."""
+    import numpy as np
     
-    # Enhance contrast
-    enhancer = ImageEnhance.Contrast(image)
-    image = enhancer.enhance(1.2)  # Increase contrast by 20%
+    try:
+        _run_ocr(ocr, np.zeros((32, 32, 3), dtype=np.uint8))
+        logger.info("PaddleOCR warm-up inference completed")
+    except Exception as e:
+        logger.warning(f"PaddleOCR warm-up inference failed: {e}")
+
+def warmup_ocr() -> None:
+    """Initialize PaddleOCR and run a warm-up inference.
     
-    # Enhance sharpness
-    enhancer = ImageEnhance.Sharpness(image)
-    image = enhancer.enhance(1.1)  # Increase sharpness by 10%
+    Call from the app's startup event (in a worker thread) so the first
+    request does not pay the model load cost.
+    """
+    ocr = _get_ocr_reader()
+    if not PADDLE_OCR_WARMUP:
+        # Otherwise _get_ocr_reader already ran it right after initialization
+        _run_dummy_inference(ocr)
+
+def _load_image(file_path: Path) -> Image.Image:
+    """Read an image file in one pass and decode it fully into memory.
     
+    Args:
+        file_path: Path to image file
+        
+    Returns:
+        Loaded PIL Image (no open file handle)
+    """
+    image = Image.open(io.BytesIO(file_path.read_bytes()))
+    image.load()
     return image
 
-def extract_text_from_image(image: Image.Image) -> Optional[str]:
+def preprocess_image(image: Union[Image.Image, "np.ndarray"]) -> "np.ndarray":
+    """Preprocess image to improve OCR accuracy.
+    
+    Args:
+        image: PIL Image or HxWx3 RGB uint8 array
+        
+    Returns:
+        Preprocessed HxWx3 RGB uint8 array
+    """
+    # OpenCV comes from paddleocr's own opencv-contrib-python dependency; it is
+    # not listed separately because a second OpenCV wheel would clobber cv2
+    import cv2
+    import numpy as np
+    
+    if isinstance(image, Image.Image):
+        # Convert to RGB if needed
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        arr = np.asarray(image, dtype=np.float32)
+    else:
+        arr = image.astype(np.float32)
+    
+    # Enhance contrast: stretch 20% around mean luminance (as ImageEnhance.Contrast)
+    mean = float((arr @ np.array([0.299, 0.587, 0.114], dtype=np.float32)).mean())
+    arr -= mean
+    arr *= 1.2
+    arr += mean
+    np.clip(arr, 0, 255, out=arr)
+    
+    # Enhance sharpness: push 10% away from a 3x3 smoothed copy (as ImageEnhance.Sharpness)
+    smooth_kernel = np.array([[1, 1, 1], [1, 5, 1], [1, 1, 1]], dtype=np.float32) / 13
+    smooth = cv2.filter2D(arr, -1, smooth_kernel)
+    arr = cv2.addWeighted(arr, 1.1, smooth, -0.1, 0)
+    
+    return np.clip(arr, 0, 255, out=arr).astype(np.uint8)
+
+def extract_text_from_image(image: Union[Image.Image, "np.ndarray"]) -> Optional[str]:
     """Extract text from image using PaddleOCR.
     
     Args:
-        image: PIL Image
+        image: PIL Image or HxWx3 RGB uint8 array
         
     Returns:
         Extracted text as string or None if extraction fails
     """
+    import numpy as np
+    
     try:
-        # Preprocess image first
-        image = preprocess_image(image)
+        # Preprocess image first (yields the array PaddleOCR consumes)
+        img_array = preprocess_image(image)
         
         # Get cached reader
         ocr = _get_ocr_reader()
         
-        # Convert PIL Image to numpy array
-        img_array = np.array(image)
-        
         # Run OCR (rotation detection handled by use_angle_cls in initialization)
-        results = ocr.ocr(img_array)
+        results = _run_ocr(ocr, img_array)
         
         if not results or not results[0]:
             logger.warning("OCR returned no results")
             return None
         
-        # Extract text from results
-        # PaddleOCR returns: [[[bbox, (text, confidence)], ...]]
-        text_parts = []
-        box_count = 0
-        for line in results[0]:
-            if line and len(line) >= 2:
-                # line format: [bbox, (text, confidence)]
-                text_info = line[1]
-                if isinstance(text_info, (list, tuple)) and len(text_info) >= 2:
-                    text, confidence = text_info[0], text_info[1]
-                elif isinstance(text_info, str):
-                    # Sometimes it's just the text
-                    text = text_info
-                    confidence = 1.0
-                else:
-                    continue
+        page_result = results[0]
+        if isinstance(page_result, dict) and "rec_texts" in page_result:
+            # PaddleOCR 3.x: parallel rec_texts / rec_scores, filter by confidence
+            keep = np.asarray(page_result["rec_scores"]) > OCR_MIN_CONFIDENCE
+            text_parts = [text for text, kept in zip(page_result["rec_texts"], keep) if kept]
+        else:
+            # PaddleOCR 2.x returns: [[[bbox, (text, confidence)], ...]]
+            text_parts = []
+            for line in page_result:
+                if line and len(line) >= 2:
+                    # line format: [bbox, (text, confidence)]
+                    text_info = line[1]
+                    if isinstance(text_info, (list, tuple)) and len(text_info) >= 2:
+                        text, confidence = text_info[0], text_info[1]
+                    elif isinstance(text_info, str):
+                        # Sometimes it's just the text
+                        text = text_info
+                        confidence = 1.0
+                    else:
+                        continue
                     
-                if confidence > 0.3:  # Filter by confidence
-                    text_parts.append(text)
-                    box_count += 1
+                    if confidence > OCR_MIN_CONFIDENCE:  # Filter by confidence
+                        text_parts.append(text)
         
         if text_parts:
             ocr_text = " ".join(text_parts)
             logger.info(
-                f"OCR extracted {len(ocr_text)} characters "
-                f"({box_count} text boxes detected)"
+                "OCR extracted %d characters (%d text boxes detected)",
+                len(ocr_text), len(text_parts)
             )
             return ocr_text
         
@@ -120,6 +207,78 @@ def extract_text_from_image(image: Image.Image) -> Optional[str]:
         logger.error(f"OCR extraction failed: {e}")
         return None
 
+def _extract_text_from_pdf_doc(doc: fitz.Document) -> Optional[str]:
+    """Extract text from an open PDF, falling back to OCR on ALL pages.
+    
+    Args:
+        doc: Open PyMuPDF document
+        
+    Returns:
+        Extracted text or None if extraction fails
+    """
+    # Try direct text extraction first
+    text = extract_text_from_pdf(doc)
+    
+    if text and len(text.strip()) >= 50:
+        logger.info("Direct text extraction successful, using extracted text")
+        return text
+    
+    # Fall back to OCR on all pages
+    logger.info(
+        "Direct text extraction yielded insufficient text, "
+        "using OCR on all pages..."
+    )
+    
+    page_count = get_pdf_page_count(doc)
+    if page_count == 0:
+        logger.error("Failed to get PDF page count")
+        return None
+    
+    logger.info("Processing %d pages with OCR", page_count)
+    
+    # Render on this thread (PyMuPDF documents are not thread-safe) while
+    # earlier pages are OCR'd on the pool; results are collected in page order
+    page_texts = []
+    pending = deque()
+    
+    def collect(page_num: int, future: Future) -> None:
+        try:
+            page_text = future.result()
+        except Exception as e:
+            logger.warning(f"Failed to process page {page_num + 1}: {e}")
+            return
+        if page_text:
+            page_texts.append(f"[Page {page_num + 1}]\n{page_text}")
+            logger.debug(
+                "Extracted %d characters from page %d", len(page_text), page_num + 1
+            )
+    
+    for page_num in range(page_count):
+        if len(pending) >= _OCR_MAX_PENDING:
+            collect(*pending.popleft())
+        
+        # Convert page to image
+        image = convert_pdf_page_to_image(doc, page_num)
+        if image is None:
+            logger.warning(f"Failed to convert page {page_num + 1} to image")
+            continue
+        
+        pending.append((page_num, _ocr_executor.submit(extract_text_from_image, image)))
+    
+    while pending:
+        collect(*pending.popleft())
+    
+    if page_texts:
+        combined_text = "\n\n".join(page_texts)
+        logger.info(
+            "OCR extraction completed: %d characters from %d pages",
+            len(combined_text), len(page_texts)
+        )
+        return combined_text
+    
+    logger.error("Failed to extract text from any PDF page using OCR")
+    return None
+
 def extract_text_from_pdf_or_image(file_path: Path) -> Optional[str]:
     """Extract text from PDF or image file.
     
@@ -135,66 +294,24 @@ def extract_text_from_pdf_or_image(file_path: Path) -> Optional[str]:
     file_ext = file_path.suffix.lower()
     
     if file_ext == '.pdf':
-        logger.info(f"Processing PDF: {file_path.name}")
-        
-        # Try direct text extraction first
-        text = extract_text_from_pdf(file_path)
-        
-        if text and len(text.strip()) >= 50:
-            logger.info("Direct text extraction successful, using extracted text")
-            return text
-        
-        # Fall back to OCR on all pages
-        logger.info(
-            "Direct text extraction yielded insufficient text, "
-            "using OCR on all pages..."
-        )
+        logger.info("Processing PDF: %s", file_path.name)
         
-        page_count = get_pdf_page_count(file_path)
-        if page_count == 0:
-            logger.error("Failed to get PDF page count")
+        # Open once and share the parsed document across all helpers
+        try:
+            doc = fitz.open(str(file_path))
+        except Exception as e:
+            logger.error(f"Failed to open PDF: {e}")
             return None
         
-        logger.info(f"Processing {page_count} pages with OCR")
-        
-        # Extract text from all pages
-        page_texts = []
-        for page_num in range(page_count):
-            try:
-                # Convert page to image
-                image = convert_pdf_page_to_image(file_path, page_num)
-                if not image:
-                    logger.warning(f"Failed to convert page {page_num + 1} to image")
-                    continue
-                
-                # Extract text from image
-                page_text = extract_text_from_image(image)
-                if page_text:
-                    page_texts.append(f"[Page {page_num + 1}]\n{page_text}")
-                    logger.debug(
-                        f"Extracted {len(page_text)} characters from page {page_num + 1}"
-                    )
-            except Exception as e:
-                logger.warning(f"Failed to process page {page_num + 1}: {e}")
-                continue
-        
-        if page_texts:
-            combined_text = "\n\n".join(page_texts)
-            logger.info(
-                f"OCR extraction completed: {len(combined_text)} characters "
-                f"from {len(page_texts)} pages"
-            )
-            return combined_text
-        
-        logger.error("Failed to extract text from any PDF page using OCR")
-        return None
+        with doc:
+            return _extract_text_from_pdf_doc(doc)
         
     elif file_ext in ['.jpg', '.jpeg', '.png']:
-        logger.info(f"Processing image: {file_path.name}")
+        logger.info("Processing image: %s", file_path.name)
         
         try:
             # Load image
-            image = Image.open(file_path)
+            image = _load_image(file_path)
             
             # Extract text
             text = extract_text_from_image(image)
@@ -208,24 +325,14 @@ def extract_text_from_pdf_or_image(file_path: Path) -> Optional[str]:
         logger.error(f"Unsupported file type: {file_ext}")
         return None
 
-def extract_passport_text_with_gemini(file_path: Path) -> Optional[str]:
-    """Extract text from passport using Gemini's multimodal OCR with File API.
-    
-    For PDFs: Uploads directly to Gemini using File API (v1beta).
-    For images: Uses Gemini OCR directly.
-    
-    Args:
-        file_path: Path to PDF or image file
-        
-    Returns:
-        Extracted text or None if extraction fails
-    """
-    try:
-        # Configure Gemini
-        genai.configure(api_key=GEMINI_API_KEY)
-        model = genai.GenerativeModel(GEMINI_MODEL_NAME)
-        
-        prompt = """Extract ALL text from this passport document. 
+# Global Gemini model for passport OCR (lazy initialization)
+_gemini_model = None
+
+# PDFs below this size are sent inline; Gemini caps the whole request at 20 MB
+# and inline data is base64-encoded (+33%), so leave room for that and the prompt
+_INLINE_PDF_MAX_BYTES = 14 * 1024 * 1024
+
+_PASSPORT_PROMPT = """Extract ALL text from this passport document. 
 Return the text exactly as it appears, preserving line breaks and structure.
 Include all visible text including:
 - Names (surname, given names, middle names)
@@ -242,10 +349,41 @@ Include all visible text including:
 Return ONLY the extracted text, no explanations, no formatting, no markdown.
 Preserve the original structure and line breaks."""
 
+def _get_gemini_model():
+    """Get or initialize the Gemini model used for passport OCR (cached).
+    
+    Returns:
+        GenerativeModel instance
+    """
+    global _gemini_model
+    if _gemini_model is None:
+        import google.generativeai as genai
+        
+        genai.configure(api_key=GEMINI_API_KEY)
+        _gemini_model = genai.GenerativeModel(GEMINI_MODEL_NAME)
+    return _gemini_model
+
+def extract_passport_text_with_gemini(file_path: Path) -> Optional[str]:
+    """Extract text from passport using Gemini's multimodal OCR with File API.
+    
+    For PDFs: Sends small files inline; uploads larger ones with the File API (v1beta).
+    For images: Uses Gemini OCR directly.
+    
+    Args:
+        file_path: Path to PDF or image file
+        
+    Returns:
+        Extracted text or None if extraction fails
+    """
+    import google.generativeai as genai
+    
+    try:
+        model = _get_gemini_model()
+        
         file_ext = file_path.suffix.lower()
         
         if file_ext == '.pdf':
-            logger.info(f"Processing passport PDF with Gemini File API: {file_path.name}")
+            logger.info("Processing passport PDF with Gemini: %s", file_path.name)
             
             # Try direct text extraction first
             text = extract_text_from_pdf(file_path)
@@ -254,35 +392,38 @@ Preserve the original structure and line breaks."""
                 logger.info("Direct text extraction successful for passport")
                 return text
             
-            # Fall back to Gemini File API for OCR
+            # Small PDFs go inline with the request, skipping File API upload/delete
+            if file_path.stat().st_size < _INLINE_PDF_MAX_BYTES:
+                logger.info("Direct text insufficient, sending PDF inline to Gemini...")
+                response = model.generate_content([
+                    _PASSPORT_PROMPT,
+                    {"mime_type": "application/pdf", "data": file_path.read_bytes()}
+                ])
+                return response.text.strip() if response.text else None
+            
+            # Fall back to Gemini File API (streamed resumable upload) for large PDFs
             logger.info("Direct text insufficient, uploading PDF to Gemini...")
             
             # Upload file to Gemini
             gemini_file = genai.upload_file(path=file_path, display_name=file_path.name)
-            logger.info(f"File uploaded to Gemini: {gemini_file.uri}")
+            logger.info("File uploaded to Gemini: %s", gemini_file.uri)
             
             try:
                 # Generate content using the file URI
-                response = model.generate_content([prompt, gemini_file])
-                
-                # Cleanup: Delete the file from Gemini storage
-                genai.delete_file(gemini_file.name)
-                logger.info("Cleaned up file from Gemini storage")
-                
+                response = model.generate_content([_PASSPORT_PROMPT, gemini_file])
                 return response.text.strip() if response.text else None
-                
-            except Exception as e:
-                # Ensure cleanup happens even on error
+            finally:
+                # Cleanup: Delete the file from Gemini storage
                 try:
                     genai.delete_file(gemini_file.name)
-                except:
-                    pass
-                raise e
+                    logger.info("Cleaned up file from Gemini storage")
+                except Exception as e:
+                    logger.warning(f"Failed to delete file from Gemini storage: {e}")
             
         elif file_ext in ['.jpg', '.jpeg', '.png']:
-            logger.info(f"Processing passport image with Gemini: {file_path.name}")
-            image = Image.open(file_path)
-            response = model.generate_content([prompt, image])
+            logger.info("Processing passport image with Gemini: %s", file_path.name)
+            image = _load_image(file_path)
+            response = model.generate_content([_PASSPORT_PROMPT, image])
             return response.text.strip() if response.text else None
             
         else:
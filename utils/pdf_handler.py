@@ -1,40 +1,62 @@
 """PDF handling utilities using PyMuPDF."""
 
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional
-from PIL import Image
+from typing import TYPE_CHECKING, Iterator, Optional, Union
 import fitz  # PyMuPDF
 from utils.logger import logger
 
-def extract_text_from_pdf(file_path: Path) -> Optional[str]:
+if TYPE_CHECKING:
+    import numpy as np
+
+# Helpers accept a path or an already-open document so callers that touch the
+# same PDF several times can parse it once
+PdfSource = Union[Path, fitz.Document]
+
+# Longest rendered page side for OCR; PaddleOCR gains nothing from more pixels
+MAX_RENDER_LONG_SIDE_PX = 1600
+
+@contextmanager
+def _open_pdf(source: PdfSource) -> Iterator[fitz.Document]:
+    """Yield an open document, closing it afterwards only if opened here.
+    
+    Args:
+        source: Path to PDF file or open document
+        
+    Yields:
+        Open PyMuPDF document
+    """
+    if isinstance(source, fitz.Document):
+        yield source
+        return
+    with fitz.open(str(source)) as doc:
+        yield doc
+
+def extract_text_from_pdf(file_path: PdfSource) -> Optional[str]:
     """Extract text directly from PDF using PyMuPDF.
     
     Extracts text from ALL pages in the PDF.
     
     Args:
-        file_path: Path to PDF file
+        file_path: Path to PDF file or open document
         
     Returns:
         Combined text from all pages or None if extraction fails
     """
     try:
-        doc = fitz.open(str(file_path))
-        text_parts = []
-        
-        # Extract text from all pages
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            text = page.get_text()
-            if text:
-                text_parts.append(f"[Page {page_num + 1}]\n{text}")
-        
-        doc.close()
+        with _open_pdf(file_path) as doc:
+            # Extract text from all pages
+            text_parts = [
+                f"[Page {page_num + 1}]\n{text}"
+                for page_num, page in enumerate(doc)
+                if (text := page.get_text())
+            ]
         
         if text_parts:
             full_text = "\n\n".join(text_parts)
             logger.info(
-                f"Extracted {len(full_text)} characters from PDF "
-                f"({len(text_parts)} pages) using direct text extraction"
+                "Extracted %d characters from PDF (%d pages) using direct text extraction",
+                len(full_text), len(text_parts)
             )
             return full_text
         
@@ -46,48 +68,60 @@ def extract_text_from_pdf(file_path: Path) -> Optional[str]:
         return None
 
 def convert_pdf_page_to_image(
-    file_path: Path,
+    file_path: PdfSource,
     page_num: int = 0,
-    dpi: int = 300
-) -> Optional[Image.Image]:
-    """Convert PDF page to PIL Image using PyMuPDF.
+    dpi: int = 200,
+    max_long_side_px: Optional[int] = MAX_RENDER_LONG_SIDE_PX
+) -> Optional["np.ndarray"]:
+    """Convert PDF page to an RGB NumPy array using PyMuPDF.
+    
+    The resolution is capped so the long side is at most max_long_side_px.
+    PaddleOCR downsamples larger inputs anyway, and pixmap size grows with DPI
+    squared. Callers that need full detail (e.g. 300 DPI) should pass the dpi
+    and max_long_side_px=None.
     
     Args:
-        file_path: Path to PDF file
+        file_path: Path to PDF file or open document
         page_num: Page number to convert (0-indexed)
-        dpi: Resolution for image (default: 400)
+        dpi: Resolution for image (default: 200)
+        max_long_side_px: Pixel cap for the longer page side, or None for no cap
         
     Returns:
-        PIL Image or None if conversion fails
+        HxWx3 uint8 array or None if conversion fails
     """
+    import numpy as np
+    
     try:
-        doc = fitz.open(str(file_path))
-        
-        if page_num >= len(doc):
-            logger.warning(
-                f"Page {page_num} not found in PDF "
-                f"(document has {len(doc)} pages)"
-            )
-            doc.close()
-            return None
-        
-        # Get page
-        page = doc[page_num]
-        
-        # Calculate zoom factor for desired DPI (default is 72 DPI)
-        zoom = dpi / 72.0
-        mat = fitz.Matrix(zoom, zoom)
-        
-        # Render page to pixmap
-        pix = page.get_pixmap(matrix=mat)
-        
-        # Convert to PIL Image
-        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+        with _open_pdf(file_path) as doc:
+            if page_num >= len(doc):
+                logger.warning(
+                    f"Page {page_num} not found in PDF "
+                    f"(document has {len(doc)} pages)"
+                )
+                return None
+            
+            # Get page
+            page = doc[page_num]
+            
+            # Cap DPI by the long-side pixel budget (page rect is in 72 DPI points)
+            if max_long_side_px:
+                long_side_pt = max(page.rect.width, page.rect.height)
+                dpi = min(dpi, max_long_side_px * 72.0 / long_side_pt)
+            
+            # Calculate zoom factor for desired DPI (default is 72 DPI)
+            zoom = dpi / 72.0
+            mat = fitz.Matrix(zoom, zoom)
+            
+            # Render page to pixmap
+            pix = page.get_pixmap(matrix=mat, alpha=False)
+            
+            # View the pixmap buffer as an array; copy once since pix is freed
+            img = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(
+                pix.height, pix.width, pix.n
+            ).copy()
         
-        doc.close()
         logger.debug(
-            f"Converted PDF page {page_num + 1} to image "
-            f"({pix.width}x{pix.height})"
+            "Converted PDF page %d to image (%dx%d)", page_num + 1, pix.width, pix.height
         )
         return img
         
@@ -95,20 +129,18 @@ def convert_pdf_page_to_image(
         logger.error(f"Failed to convert PDF page to image: {e}")
         return None
 
-def get_pdf_page_count(file_path: Path) -> int:
+def get_pdf_page_count(file_path: PdfSource) -> int:
     """Get the number of pages in a PDF.
     
     Args:
-        file_path: Path to PDF file
+        file_path: Path to PDF file or open document
         
     Returns:
         Number of pages in PDF, or 0 on error
     """
     try:
-        doc = fitz.open(str(file_path))
-        page_count = len(doc)
-        doc.close()
-        return page_count
+        with _open_pdf(file_path) as doc:
+            return len(doc)
     except Exception as e:
         logger.error(f"Failed to get PDF page count: {e}")
         return 0
@@ -1,7 +1,23 @@
 """File validation utilities."""
 
+import os
 from fastapi import UploadFile
 
+# Accepted upload extensions (lowercase, with leading dot)
+_VALID_EXT = frozenset({'.pdf', '.jpg', '.jpeg', '.png'})
+
+def size_limit_error(filename: str, max_size_mb: int) -> ValueError:
+    """Build the error raised when an upload exceeds the size limit.
+    
+    Args:
+        filename: Uploaded file name
+        max_size_mb: Maximum file size in MB
+        
+    Returns:
+        ValueError with the user-facing message
+    """
+    return ValueError(f"File too large: {filename} exceeds {max_size_mb} MB limit")
+
 def validate_upload(file: UploadFile, max_size_mb: int) -> None:
     """Validate uploaded file.
     
@@ -17,17 +33,17 @@ def validate_upload(file: UploadFile, max_size_mb: int) -> None:
         raise ValueError("No file uploaded")
     
     # Check file extension (case insensitive)
-    valid_extensions = {'.pdf', '.jpg', '.jpeg', '.png'}
-    file_ext = file.filename.lower().split('.')[-1]
-    if f'.{file_ext}' not in valid_extensions:
+    file_ext = os.path.splitext(file.filename)[1].lower()
+    if file_ext not in _VALID_EXT:
         raise ValueError(
-            f"Invalid file type: .{file_ext}. "
+            f"Invalid file type: {file_ext or '(none)'}. "
             f"Supported formats: PDF, JPEG, PNG"
         )
     
-    # Check file size (if content_type indicates size)
-    # Note: We'll do a more thorough check when reading the file
-    # For now, just do basic validation
+    # Reject by declared size up front; save_upload enforces the limit while streaming
+    size = getattr(file, "size", None)
+    if size is not None and size > max_size_mb * 1024 * 1024:
+        raise size_limit_error(file.filename, max_size_mb)
     
     # File is valid
     return